@@ -2,10 +2,10 @@
 import os, asyncio
 from datetime import timezone
 from telethon import TelegramClient
-from extractor import extract_flight_fields
+from extractor import extract_flight_fields, contains_persian, contact_rows
 from city_map import to_code
 from db import SessionLocal
-from models import AppUser, Post, Trip
+from models import AppUser, Post, Trip, PostContact
 
 API_ID   = int(os.getenv("TG_API_ID"))
 API_HASH = os.getenv("TG_API_HASH")
@@ -19,9 +19,15 @@ async def main():
 
     db = SessionLocal()
     try:
+        # one SELECT for everything already stored from this chat
+        existing = {mid for (mid,) in db.query(Post.message_id).filter(Post.chat_id == entity.id).all()}
+
         async for m in client.iter_messages(entity, limit=500):
             text = (m.message or "").strip()
             if not text: continue
+            if m.id in existing:
+                continue
+            existing.add(m.id)
 
             # upsert user
             sender = await m.get_sender()
@@ -34,10 +40,7 @@ async def main():
                 )
                 db.add(u); db.flush()
 
-            # upsert post
-            p = db.query(Post).filter_by(chat_id=entity.id, message_id=m.id).one_or_none()
-            if p: 
-                continue
+            # new post
             fields = extract_flight_fields(text)
 
             p = Post(
@@ -46,12 +49,13 @@ async def main():
                 posted_at=m.date.astimezone(timezone.utc),
                 posted_by=u.id,
                 raw_text=fields["raw_text"],
-                lang="fa" if any('\u0600' <= ch <= '\u06FF' for ch in fields["raw_text"]) else "en",
+                lang="fa" if contains_persian(fields["raw_text"]) else "en",
                 type_tag=("مسافر" if "مسافر" in fields["type_tags"] else ("قبول_بار" if "قبول" in fields["type_tags"] else None)),
                 contact_handles=fields["contact_handles"].split(";") if fields["contact_handles"] else [],
                 contact_phones=fields["contact_phones"].split(";") if fields["contact_phones"] else []
             )
             db.add(p); db.flush()
+            db.add_all(PostContact(**r) for r in contact_rows(p.id, p.contact_handles, p.contact_phones))
 
             # trip
             trip = Trip(
@@ -1,17 +1,22 @@
 # api.py — FastAPI search over scraped Telegram posts
 
-import os
-from datetime import date
-from typing import Optional, List, Dict, Any
+import os, base64
+from datetime import date, datetime
+from typing import Optional, List, Dict, Any, Tuple, AsyncIterator
 
-from fastapi import FastAPI, Query
+import orjson
+from cachetools import TTLCache
+from fastapi import Depends, FastAPI, Query, Request
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import Response
 from fastapi.staticfiles import StaticFiles  # <-- added
-from sqlalchemy.orm import Session
+from sqlalchemy import and_, or_, func, select, text
+from sqlalchemy.ext.asyncio import AsyncSession
 
 # Load DB session + models
-from db import SessionLocal
-from models import Trip, Post
+from db import AsyncSessionLocal, IS_POSTGRES
+from models import Trip, Post, PostContact
+from extractor import norm_digits, phone_digits
 
 # Optional: load .env if present
 try:
@@ -46,12 +51,24 @@ app.mount("/static", StaticFiles(directory="static"), name="static")  # <-- adde
 
 # ------------------- helpers -------------------
 
-def get_db() -> Session:
-    db = SessionLocal()
-    try:
+# Recent /search responses keyed by query string. Ingest runs in another process,
+# so new posts show up once the entry expires (SEARCH_CACHE_TTL seconds).
+_SEARCH_CACHE: TTLCache = TTLCache(maxsize=1024, ttl=int(os.getenv("SEARCH_CACHE_TTL", "60")))
+
+# Only what /search renders: no full ORM objects, and just the first 200 chars of the post
+_RESULT_COLUMNS = (
+    Trip.id.label("trip_id"),
+    Trip.origin_city, Trip.origin_code,
+    Trip.destination_city, Trip.destination_code,
+    Trip.flight_date, Trip.flight_date_text, Trip.flight_time_text, Trip.airline,
+    Post.message_id, Post.chat_id, Post.posted_at, Post.type_tag,
+    Post.contact_handles, Post.contact_phones,
+    func.substr(Post.raw_text, 1, 200).label("snippet"),
+)
+
+async def get_db() -> AsyncIterator[AsyncSession]:
+    async with AsyncSessionLocal() as db:
         yield db
-    finally:
-        db.close()
 
 def _parse_iso_date(s: Optional[str]) -> Optional[date]:
     if not s:
@@ -61,6 +78,57 @@ def _parse_iso_date(s: Optional[str]) -> Optional[date]:
     except Exception:
         return None
 
+def _encode_cursor(flight_date: Optional[date], posted_at: Optional[datetime], trip_id: int) -> str:
+    raw = "|".join([flight_date.isoformat() if flight_date else "",
+                    posted_at.isoformat() if posted_at else "",
+                    str(trip_id)])
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+def _decode_cursor(s: Optional[str]) -> Optional[Tuple[Optional[date], Optional[datetime], int]]:
+    if not s:
+        return None
+    try:
+        raw = base64.urlsafe_b64decode(s + "=" * (-len(s) % 4)).decode()
+        fd, pa, tid = raw.split("|")
+        return (date.fromisoformat(fd) if fd else None,
+                datetime.fromisoformat(pa) if pa else None,
+                int(tid))
+    except Exception:
+        return None
+
+def _after_cursor(fd: Optional[date], pa: Optional[datetime], tid: int):
+    """Rows strictly after (fd, pa, tid) in the /search sort order:
+    flight_date ASC (NULLs last), posted_at DESC (NULLs last), trip.id DESC.
+    A cursor with an empty posted_at sits in the NULL posted_at tail."""
+    tie = Trip.id < tid
+    if pa is None:
+        tie = and_(Post.posted_at.is_(None), tie)
+    else:
+        tie = or_(Post.posted_at.is_(None), Post.posted_at < pa,
+                  and_(Post.posted_at == pa, tie))
+    if fd is None:
+        return and_(Trip.flight_date.is_(None), tie)
+    return or_(
+        Trip.flight_date.is_(None),
+        Trip.flight_date > fd,
+        and_(Trip.flight_date == fd, tie),
+    )
+
+async def _estimated_total(db: AsyncSession) -> Optional[int]:
+    """Planner row estimate for the unfiltered join (Postgres only)."""
+    if not IS_POSTGRES:
+        return None
+    n = await db.scalar(text("SELECT reltuples::bigint FROM pg_class WHERE oid = 'trip'::regclass"))
+    return n if n is not None and n >= 0 else None
+
+def _text_filter(q: str):
+    """Whole-word lookups use the post.raw_text_tsv GIN index on Postgres;
+    short or multi-word input keeps the substring ILIKE (trigram index)."""
+    word = q.strip()
+    if IS_POSTGRES and len(word) >= 3 and not any(c.isspace() for c in word):
+        return text("post.raw_text_tsv @@ plainto_tsquery('simple', :q)").bindparams(q=word)
+    return Post.raw_text.ilike(f"%{q}%")
+
 # ------------------- endpoints -------------------
 
 @app.get("/health")
@@ -72,7 +140,8 @@ def version() -> Dict[str, str]:
     return {"version": os.getenv("APP_VERSION", "dev")}
 
 @app.get("/search")
-def search(
+async def search(
+    request: Request,
     origin: Optional[str] = Query(None, description="Origin IATA code, e.g., THR, IKA, YYZ"),
     destination: Optional[str] = Query(None, description="Destination IATA code"),
     date_from: Optional[str] = Query(None, description="YYYY-MM-DD"),
@@ -80,68 +149,99 @@ def search(
     type_tag: Optional[str] = Query(None, description="e.g., 'مسافر' or 'قبول_بار'"),
     airline: Optional[str] = Query(None, description="Filter by airline text"),
     q: Optional[str] = Query(None, description="Free-text search in original post"),
+    contact: Optional[str] = Query(None, description="Telegram handle or phone (partial ok), e.g. @ali"),
     limit: int = Query(50, ge=1, le=200),
     offset: int = Query(0, ge=0),
+    after: Optional[str] = Query(None, description="next_cursor from the previous page"),
+    include_count: bool = Query(False, description="Also return the total match count"),
+    db: AsyncSession = Depends(get_db),
 ):
-    """Search parsed trips. Use IATA codes for origin/destination if possible."""
+    """Search parsed trips. Use IATA codes for origin/destination if possible.
+
+    Page with `after=<next_cursor>`; `offset` still works but scans skipped rows.
+    """
+    key = tuple(sorted(request.query_params.multi_items()))
+    cached = _SEARCH_CACHE.get(key)
+    if cached is not None:
+        return Response(cached, media_type="application/json")
+
     df = _parse_iso_date(date_from)
     dt = _parse_iso_date(date_to)
+    cursor = _decode_cursor(after)
+
+    stmt = select(*_RESULT_COLUMNS).join(Post, Trip.post_id == Post.id)
+
+    if origin:
+        stmt = stmt.where(Trip.origin_code == origin.upper())
+    if destination:
+        stmt = stmt.where(Trip.destination_code == destination.upper())
+    if df:
+        stmt = stmt.where(Trip.flight_date >= df)
+    if dt:
+        stmt = stmt.where(Trip.flight_date <= dt)
+    if type_tag:
+        stmt = stmt.where(Post.type_tag == type_tag)
+    if airline:
+        stmt = stmt.where(Trip.airline.ilike(f"%{airline}%"))
+    if q:
+        stmt = stmt.where(_text_filter(q))
+    if contact:
+        needle = norm_digits(contact.strip())
+        if not any(c.isalpha() or c in "@_" for c in needle):
+            needle = phone_digits(needle) or needle   # phones are stored digits-only
+        stmt = stmt.where(Post.id.in_(
+            select(PostContact.post_id).where(PostContact.value.ilike(f"%{needle}%"))
+        ))
+
+    total = None
+    if include_count:
+        filtered = any([origin, destination, df, dt, type_tag, airline, q, contact])
+        total = None if filtered else await _estimated_total(db)
+        if total is None:
+            total = await db.scalar(select(func.count()).select_from(stmt.subquery()))
+
+    if cursor:
+        stmt = stmt.where(_after_cursor(*cursor))
+
+    # NULLs last on both keys, spelled out so SQLite and Postgres agree
+    stmt = stmt.order_by(Trip.flight_date.is_(None), Trip.flight_date,
+                         Post.posted_at.is_(None), Post.posted_at.desc(), Trip.id.desc())
+    rows = (await db.execute(stmt.offset(offset).limit(limit))).all()
+
+    results: List[Dict[str, Any]] = []
+    for r in rows:
+        contacts = sorted(set((r.contact_handles or []) + (r.contact_phones or [])))
+        route = f"{(r.origin_code or r.origin_city or '')}→{(r.destination_code or r.destination_city or '')}"
+        results.append({
+            "message_id": r.message_id,
+            "chat_id": r.chat_id,                 # <-- add
+            "posted_at": r.posted_at,
+            "type": r.type_tag,
+            "origin": r.origin_city,
+            "origin_code": r.origin_code,
+            "destination": r.destination_city,
+            "destination_code": r.destination_code,
+            "route": route,                       # <-- add
+            "date": r.flight_date or r.flight_date_text,
+            "time": r.flight_time_text,
+            "airline": r.airline,
+            "contacts": contacts,
+            "snippet": r.snippet or "",
+        })
+
+    next_cursor = None
+    if len(rows) == limit:
+        last = rows[-1]
+        next_cursor = _encode_cursor(last.flight_date, last.posted_at, last.trip_id)
+
+    # orjson writes dates/datetimes and Farsi text directly (no jsonable_encoder pass)
+    body = orjson.dumps({
+        "count": total,
+        "limit": limit,
+        "offset": offset,
+        "next_cursor": next_cursor,
+        "results": results,
+    })
+    _SEARCH_CACHE[key] = body
+    return Response(body, media_type="application/json")
 
-    db_gen = get_db()
-    db = next(db_gen)
-
-    try:
-        qry = db.query(Trip, Post).join(Post, Trip.post_id == Post.id)
-
-        if origin:
-            qry = qry.filter(Trip.origin_code == origin.upper())
-        if destination:
-            qry = qry.filter(Trip.destination_code == destination.upper())
-        if df:
-            qry = qry.filter(Trip.flight_date >= df)
-        if dt:
-            qry = qry.filter(Trip.flight_date <= dt)
-        if type_tag:
-            qry = qry.filter(Post.type_tag == type_tag)
-        if airline:
-            qry = qry.filter(Trip.airline.ilike(f"%{airline}%"))
-        if q:
-            qry = qry.filter(Post.raw_text.ilike(f"%{q}%"))
-
-        qry = qry.order_by(Trip.flight_date.is_(None), Trip.flight_date, Post.posted_at.desc())
-        total = qry.count()
-        rows = qry.offset(offset).limit(limit).all()
-
-        results: List[Dict[str, Any]] = []
-        for t, p in rows:
-            contacts = sorted(set((p.contact_handles or []) + (p.contact_phones or [])))
-            route = f"{(t.origin_code or t.origin_city or '')}→{(t.destination_code or t.destination_city or '')}"
-            results.append({
-                "message_id": p.message_id,
-                "chat_id": p.chat_id,                 # <-- add
-                "posted_at": p.posted_at,
-                "type": p.type_tag,
-                "origin": t.origin_city,
-                "origin_code": t.origin_code,
-                "destination": t.destination_city,
-                "destination_code": t.destination_code,
-                "route": route,                       # <-- add
-                "date": (t.flight_date.isoformat() if t.flight_date else t.flight_date_text),
-                "time": t.flight_time_text,
-                "airline": t.airline,
-                "contacts": contacts,
-                "snippet": (p.raw_text or "")[:200],
-            })
-
-        return {
-            "count": total,
-            "limit": limit,
-            "offset": offset,
-            "results": results,
-        }
-
-    finally:
-        try:
-            next(db_gen)  # close generator
-        except StopIteration:
-            pass
@@ -1,6 +1,7 @@
 # city_map.py — FA/EN city/airport aliases → IATA code
 
 import re
+from functools import lru_cache
 
 ALIASES = {
     # ---- Iran (city or main airport) ----
@@ -49,18 +50,37 @@ ALIASES = {
     "مسقط": "MCT", "muscat": "MCT", "mct": "MCT",
 }
 
+# punctuation → space in one C-level pass; generic airport words dropped by one regex
+_NORM_TABLE = str.maketrans({c: " " for c in "().,-/_|:;!?\"'"})
+_RX_DROP    = re.compile(r"\b(?:airport|intl|international)\b", re.I)
+
 def _norm(s: str) -> str:
     if not s: return ""
-    s = s.strip().lower()
-    # remove generic words
-    s = s.replace("airport", "").replace("intl", "").replace("international", "")
-    # drop parentheses content and punctuation
-    s = re.sub(r"\(.*?\)", " ", s)
-    s = re.sub(r"[^\w\u0600-\u06FF\s]", " ", s)
-    s = re.sub(r"\s+", " ", s).strip()
-    return s
+    s = _RX_DROP.sub(" ", s.lower())
+    s = s.translate(_NORM_TABLE)
+    return " ".join(s.split())
+
+# aliases keyed the same way to_code() normalizes its input
+_NORM_ALIASES = {_norm(k): v for k, v in ALIASES.items()}
+
+# Aliases that are also everyday words ("امام رضا", "I saw you", "ras al khaimah")
+# only count as an exact match, never inside a longer string.
+_AMBIGUOUS = {"امام", "saw", "ras", "ist", "doh", "ker"}
+
+# One alternation over the unambiguous aliases (longest first), bounded by \b
+# so a name doesn't fire inside another word.
+_SCAN_ALIASES = sorted(set(_NORM_ALIASES) - _AMBIGUOUS, key=len, reverse=True)
+_CITY_RX = re.compile(
+    r"\b(?:" + "|".join(map(re.escape, _SCAN_ALIASES)) + r")\b",
+    re.IGNORECASE,
+)
 
+@lru_cache(maxsize=4096)
 def to_code(s: str) -> str:
-    """Return IATA code or '' if unknown."""
+    """Return IATA code for an exact alias, else the first unambiguous alias in s; '' if unknown."""
     k = _norm(s)
-    return ALIASES.get(k, "")
+    code = _NORM_ALIASES.get(k)
+    if code:
+        return code
+    m = _CITY_RX.search(k)
+    return _NORM_ALIASES[m.group(0)] if m else ""
@@ -1,5 +1,30 @@
-# create_tables.py
-from db import engine
+# create_tables.py — create missing tables, then bring an existing database up to date
+import os
+from db import engine, IS_POSTGRES
 from models import Base
+
+MIGRATIONS = os.path.join(os.path.dirname(os.path.abspath(__file__)), "migrations")
+
+def run_sql_file(conn, name):
+    """Execute one migrations/*.sql file statement by statement (each is safe to re-run)."""
+    with open(os.path.join(MIGRATIONS, name), encoding="utf-8") as f:
+        sql = "".join(line for line in f if not line.lstrip().startswith("--"))
+    for stmt in sql.split(";"):
+        if stmt.strip():
+            conn.exec_driver_sql(stmt)
+
 Base.metadata.create_all(engine)
+
+# create_all skips tables that already exist, so apply what ingest needs by hand:
+# 005 — unique (chat_id, message_id), required by INSERT ... ON CONFLICT in ingest
+# 003 — post.raw_text_tsv, which /search?q=word queries on Postgres
+# 004/007 — post_contact rows (digits-only phones) for posts stored before it; /search?contact= reads only these
+suffix = "" if IS_POSTGRES else "_sqlite"
+with engine.begin() as conn:
+    run_sql_file(conn, "005_post_chat_msg_unique.sql")
+    if IS_POSTGRES:
+        run_sql_file(conn, "003_raw_text_tsv.sql")
+    run_sql_file(conn, f"004_post_contact_backfill{suffix}.sql")
+    run_sql_file(conn, f"007_post_contact_phone_digits{suffix}.sql")
+
 print("Tables created.")
@@ -1,7 +1,9 @@
 # db.py
 import os
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, event, make_url
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
 from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
 
 try:
     from dotenv import load_dotenv
@@ -11,10 +13,45 @@ except Exception:
 
 DB_URL = os.getenv("DATABASE_URL", "sqlite:///travmatch.db")
 
+def _async_url(url: str):
+    """Same database through its asyncio driver (asyncpg / aiosqlite)."""
+    u = make_url(url)
+    return u.set(drivername="sqlite+aiosqlite" if u.get_backend_name() == "sqlite"
+                 else "postgresql+asyncpg")
+
 # SQLite needs this connect arg
 if DB_URL.startswith("sqlite"):
-    engine = create_engine(DB_URL, connect_args={"check_same_thread": False})
+    # in-memory DBs live inside one connection → share it; file DBs keep the default pool
+    memory = DB_URL in ("sqlite://", "sqlite:///:memory:")
+    pool_kw = {"poolclass": StaticPool} if memory else {}
+    engine = create_engine(DB_URL, connect_args={"check_same_thread": False}, **pool_kw)
 else:
-    engine = create_engine(DB_URL, pool_pre_ping=True)
+    # sized for concurrent /search requests, each holding one connection
+    pool_kw = dict(
+        pool_size=int(os.getenv("DB_POOL_SIZE", "20")),
+        max_overflow=int(os.getenv("DB_MAX_OVERFLOW", "40")),
+        pool_pre_ping=True,
+        pool_recycle=1800,   # drop connections before server/proxy idle timeouts
+        pool_use_lifo=True,  # reuse warm connections, let extras idle out
+    )
+    engine = create_engine(DB_URL, **pool_kw)
+
+# sync engine: ingest scripts / create_tables; async engine: the FastAPI app
+async_engine = create_async_engine(_async_url(DB_URL), **pool_kw)
+IS_POSTGRES = engine.dialect.name == "postgresql"
+
+def _sqlite_pragmas(dbapi_conn, _record):
+    """WAL + synchronous=NORMAL: commits stop fsyncing, readers don't block the ingest writer."""
+    cur = dbapi_conn.cursor()
+    cur.execute("PRAGMA journal_mode=WAL")
+    cur.execute("PRAGMA synchronous=NORMAL")
+    cur.execute("PRAGMA temp_store=MEMORY")
+    cur.execute("PRAGMA cache_size=-65536")   # 64 MiB page cache
+    cur.close()
+
+if engine.dialect.name == "sqlite":
+    for _e in (engine, async_engine.sync_engine):
+        event.listen(_e, "connect", _sqlite_pragmas)
 
 SessionLocal = sessionmaker(bind=engine, autocommit=False, autoflush=False)
+AsyncSessionLocal = async_sessionmaker(async_engine, expire_on_commit=False)
@@ -5,12 +5,15 @@
 
 from __future__ import annotations
 import re
-from datetime import datetime, date
-from typing import Dict, Tuple
+from bisect import bisect_right
+from functools import lru_cache
+from datetime import datetime, date, timezone
+from typing import Dict, Optional, Tuple
 
 # ---------- Utilities ----------
 
-FA_TO_EN_DIGITS = str.maketrans("۰۱۲۳۴۵۶۷۸۹", "0123456789")
+# Persian (U+06F0..) and Arabic-Indic (U+0660..) digits → ASCII
+FA_TO_EN_DIGITS = str.maketrans("۰۱۲۳۴۵۶۷۸۹٠١٢٣٤٥٦٧٨٩", "01234567890123456789")
 
 GREG_MONTHS = {
     # English long
@@ -33,9 +36,12 @@ JALALI_MONTHS = {
 
 AIRLINE_WORDS = r"(?:امارات|قطر|ترکیش|لوفتانزا|ایران\s?ایر|قشم|ماهان|عمان|اروپا|Austrian|Turkish|Qatar|Emirates|Lufthansa|Oman|Iran\s?Air|Mahan)"
 
+AIRLINE_RX  = re.compile(AIRLINE_WORDS, re.I)
 HANDLE_RX   = re.compile(r"@[\w\d_]+")
 HASHTAG_RX  = re.compile(r"#\S+")
-PHONE_RX    = re.compile(r"(?:\+?\d[\d\s\-()]{8,16}\d)")  # generic intl (Iran +98, CA +1, etc.)
+PHONE_RX    = re.compile(r"(?:\+?[0-9][0-9\s\-()]{8,16}[0-9])")  # generic intl (Iran +98, CA +1, etc.); run on norm_digits text
+_FA_RX      = re.compile("[\u0600-\u06FF]")
+_SPLIT_RX   = re.compile(r"(.+?)[\(（]([^)）]+)[\)）]")   # city (area); cleanup() trims the padding
 
 def cleanup(s: str) -> str:
     if not s: return ""
@@ -47,18 +53,54 @@ def cleanup(s: str) -> str:
 def norm_digits(s: str) -> str:
     return (s or "").translate(FA_TO_EN_DIGITS)
 
+_NON_DIGIT_RX = re.compile(r"[^0-9]")
+
+def phone_digits(s: str) -> str:
+    """Phone as bare ASCII digits (its search key): '+1 (587) 555-1212' → '15875551212'."""
+    return _NON_DIGIT_RX.sub("", norm_digits(s))
+
+def contact_rows(post_id, handles, phones):
+    """post_contact column dicts for one post. Phones are stored as bare digits,
+    so a search for 5875551212 finds '+1 (587) 555-1212'."""
+    digits = [d for d in map(phone_digits, phones or []) if d]
+    return ([dict(post_id=post_id, kind="handle", value=h) for h in dict.fromkeys(handles or [])] +
+            [dict(post_id=post_id, kind="phone", value=d) for d in dict.fromkeys(digits)])
+
 def contains_persian(text: str) -> bool:
-    return any('\u0600' <= ch <= '\u06FF' for ch in text or "")
+    return bool(_FA_RX.search(text or ""))
 
 def split_city_area(text: str) -> Tuple[str, str]:
     """Return (city, area) if parentheses exist; otherwise (text, '')."""
     t = cleanup(text)
-    m = re.search(r"(.+?)\s*[\(（]\s*([^)）]+)\s*[\)）]", t)
+    if "(" not in t and "（" not in t:
+        return t, ""
+    m = _SPLIT_RX.search(t)
     return (cleanup(m.group(1)), cleanup(m.group(2))) if m else (t, "")
 
 # ---------- Date / time parsing ----------
 
-def jalali_to_gregorian(jy: int, jm: int, jd: int) -> Tuple[int, int, int]:
+_FA_GREG_NAMES = r"(ژانویه|فوریه|مارس|آوریل|مه|ژوئن|ژوئیه|جولای|اوت|آگوست|سپتامبر|اکتبر|نوامبر|دسامبر)"
+
+# Month names are matched by the regex itself; any other word still stops the
+# search there (group unset), same as the old \w+ + dict lookup.
+_EN_MONTHS     = "(?:(" + "|".join(sorted(GREG_MONTHS, key=len, reverse=True)) + r")\b|\w+)"
+
+_RX_EN_DAY_MON = re.compile(r"\b(\d{1,2})[ \-\/]" + _EN_MONTHS + r"\b", re.I)  # 22 August / 22-Aug
+_RX_EN_MON_DAY = re.compile(r"\b" + _EN_MONTHS + r"[ \-](\d{1,2})\b", re.I)     # Aug 22
+_RX_JALALI     = re.compile(r"\b(\d{1,2})\s+(فروردین|اردیبهشت|خرداد|تیر|مرداد|شهریور|مهر|آبان|آذر|دی|بهمن|اسفند)(?:\s+(\d{3,4}))?\b")
+_RX_FA_GREG_A  = re.compile(r"\b(\d{1,2})\s+" + _FA_GREG_NAMES + r"(?:\s+(\d{3,4}))?\b")   # 5 سپتامبر
+_RX_FA_GREG_B  = re.compile(r"\b" + _FA_GREG_NAMES + r"\s+(\d{1,2})(?:\s+(\d{3,4}))?\b")   # سپتامبر 5
+_RX_NUM_DATE   = re.compile(r"\b(\d{1,2})[\/\-](\d{1,2})(?:[\/\-](\d{2,4}))?\b")
+
+_RX_24H     = re.compile(r"\b([01]?\d|2[0-3])[:٫\.]([0-5]\d)\b")
+_RX_12H     = re.compile(r"\b(\d{1,2})(?::([0-5]\d))?\s*(am|pm|a\.m\.|p\.m\.)\b")
+_RX_FA_AMPM = re.compile(r"\b(\d{1,2})(?::([0-5]\d))?\s*(صبح|عصر|شب|AM|PM)\b", re.I)
+
+# Days before each Gregorian month (prefix sums) → month found with one bisect
+_CUM_COMMON = (0, 31, 59, 90, 120, 151, 181, 212, 243, 273, 304, 334, 365)
+_CUM_LEAP   = (0, 31, 60, 91, 121, 152, 182, 213, 244, 274, 305, 335, 366)
+
+def _jalali_to_gregorian(jy: int, jm: int, jd: int) -> Tuple[int, int, int]:
     """Minimal Jalali→Gregorian (Borkowski). Works fine for modern dates."""
     jy += 1595
     days = -355668 + 365 * jy + (jy // 33) * 8 + ((jy % 33 + 3) // 4) + jd + (31 * (jm - 1) if jm <= 6 else 186 + (jm - 7) * 30)
@@ -75,39 +117,55 @@ def jalali_to_gregorian(jy: int, jm: int, jd: int) -> Tuple[int, int, int]:
         days = (days - 1) % 365
     gd = days + 1
     kab = (gy % 4 == 0 and gy % 100 != 0) or (gy % 400 == 0)
-    month_days = [0,31,29 if kab else 28,31,30,31,30,31,31,30,31,30,31]
-    gm = 1
-    while gm <= 12 and gd > month_days[gm]:
-        gd -= month_days[gm]; gm += 1
-    return gy, gm, gd
+    cum = _CUM_LEAP if kab else _CUM_COMMON
+    gm = bisect_right(cum, gd - 1)
+    return gy, gm, gd - cum[gm - 1]
+
+# Posts only mention a handful of Jalali years → precompute them (~5.5k entries)
+_JALALI_CACHE = {
+    (jy, jm, jd): _jalali_to_gregorian(jy, jm, jd)
+    for jy in range(1400, 1415) for jm in range(1, 13) for jd in range(1, 32)
+}
+
+def jalali_to_gregorian(jy: int, jm: int, jd: int) -> Tuple[int, int, int]:
+    """Jalali→Gregorian; table lookup for 1400–1414, computed otherwise."""
+    return _JALALI_CACHE.get((jy, jm, jd)) or _jalali_to_gregorian(jy, jm, jd)
 
-def parse_date_guess(s: str) -> str:
+_YEAR_REFRESH = 1000          # calls between clock reads
+_year, _year_calls = 0, _YEAR_REFRESH
+
+def _current_year() -> int:
+    """UTC year, re-read every _YEAR_REFRESH calls so long-running workers see New Year."""
+    global _year, _year_calls
+    _year_calls += 1
+    if _year_calls >= _YEAR_REFRESH:
+        _year, _year_calls = datetime.now(timezone.utc).year, 0
+    return _year
+
+def parse_date_guess(s: str, _now_year: Optional[int] = None) -> str:
     """
     Try to parse many formats to ISO YYYY-MM-DD.
     Returns '' if unsure.
     """
     if not s: return ""
     t = norm_digits(cleanup(s))
+    y_now = _now_year or _current_year()
 
     # English month formats: 22 August / Aug 22 / 22-Aug
-    m = re.search(r"\b(\d{1,2})[ \-\/](\w+)\b", t, re.I)
-    if m:
+    m = _RX_EN_DAY_MON.search(t)
+    if m and m.group(2):
         d, mon = int(m.group(1)), m.group(2).lower()
-        if mon in GREG_MONTHS:
-            y = datetime.utcnow().year
-            try: return date(y, GREG_MONTHS[mon], d).isoformat()
-            except: pass
+        try: return date(y_now, GREG_MONTHS[mon], d).isoformat()
+        except: pass
 
-    m = re.search(r"\b(\w+)[ \-](\d{1,2})\b", t, re.I)
-    if m:
+    m = _RX_EN_MON_DAY.search(t)
+    if m and m.group(1):
         mon, d = m.group(1).lower(), int(m.group(2))
-        if mon in GREG_MONTHS:
-            y = datetime.utcnow().year
-            try: return date(y, GREG_MONTHS[mon], d).isoformat()
-            except: pass
+        try: return date(y_now, GREG_MONTHS[mon], d).isoformat()
+        except: pass
 
     # Persian month: 31 مرداد 1403 (year optional)
-    m = re.search(r"\b(\d{1,2})\s+(فروردین|اردیبهشت|خرداد|تیر|مرداد|شهریور|مهر|آبان|آذر|دی|بهمن|اسفند)(?:\s+(\d{3,4}))?\b", t)
+    m = _RX_JALALI.search(t)
     if m:
         d = int(m.group(1)); mon_name = m.group(2); jm = JALALI_MONTHS[mon_name]
         jy = int(m.group(3)) if m.group(3) else 1403  # sensible default
@@ -118,27 +176,27 @@ def parse_date_guess(s: str) -> str:
             pass
 
     # Persian month: "5 سپتامبر [1403|2025]" (year optional → assume current gregorian)
-    m = re.search(r"\b(\d{1,2})\s+(ژانویه|فوریه|مارس|آوریل|مه|ژوئن|ژوئیه|جولای|اوت|آگوست|سپتامبر|اکتبر|نوامبر|دسامبر)(?:\s+(\d{3,4}))?\b", t)
+    m = _RX_FA_GREG_A.search(t)
     if m:
         d = int(m.group(1)); mon = m.group(2)
-        y = int(m.group(3)) if m.group(3) else datetime.utcnow().year
+        y = int(m.group(3)) if m.group(3) else y_now
         try: return date(y, PERSIAN_GREG_MONTHS[mon], d).isoformat()
         except: pass
 
     # Persian month first: "سپتامبر 5 [2025]"
-    m = re.search(r"\b(ژانویه|فوریه|مارس|آوریل|مه|ژوئن|ژوئیه|جولای|اوت|آگوست|سپتامبر|اکتبر|نوامبر|دسامبر)\s+(\d{1,2})(?:\s+(\d{3,4}))?\b", t)
+    m = _RX_FA_GREG_B.search(t)
     if m:
         mon = m.group(1); d = int(m.group(2))
-        y = int(m.group(3)) if m.group(3) else datetime.utcnow().year
+        y = int(m.group(3)) if m.group(3) else y_now
         try: return date(y, PERSIAN_GREG_MONTHS[mon], d).isoformat()
         except: pass
 
 
     # Numeric DD/MM(/YY) or MM/DD(/YY) → guess by a>12
-    m = re.search(r"\b(\d{1,2})[\/\-](\d{1,2})(?:[\/\-](\d{2,4}))?\b", t)
+    m = _RX_NUM_DATE.search(t)
     if m:
         a, b = int(m.group(1)), int(m.group(2))
-        y = int(m.group(3)) if m.group(3) else datetime.utcnow().year
+        y = int(m.group(3)) if m.group(3) else y_now
         mm, dd = (b, a) if a > 12 else (a, b)
         try: return date(y, mm, dd).isoformat()
         except: pass
@@ -154,12 +212,12 @@ def parse_time_guess(s: str) -> str:
     t = norm_digits(cleanup(s)).lower()
 
     # 24h HH:MM
-    m = re.search(r"\b([01]?\d|2[0-3])[:٫\.]([0-5]\d)\b", t)
+    m = _RX_24H.search(t)
     if m:
         return f"{int(m.group(1)):02d}:{int(m.group(2)):02d}"
 
     # 12h like 9 pm, 9:30pm
-    m = re.search(r"\b(\d{1,2})(?::([0-5]\d))?\s*(am|pm|a\.m\.|p\.m\.)\b", t)
+    m = _RX_12H.search(t)
     if m:
         h = int(m.group(1))
         mn = int(m.group(2)) if m.group(2) else 0
@@ -169,7 +227,7 @@ def parse_time_guess(s: str) -> str:
         return f"{h:02d}:{mn:02d}"
 
     # Persian words for morning/evening (approx): 9 صبح / 7 عصر
-    m = re.search(r"\b(\d{1,2})(?::([0-5]\d))?\s*(صبح|عصر|شب|AM|PM)\b", t, re.I)
+    m = _RX_FA_AMPM.search(t)
     if m:
         h = int(m.group(1)); mn = int(m.group(2)) if m.group(2) else 0
         tag = m.group(3)
@@ -181,13 +239,21 @@ def parse_time_guess(s: str) -> str:
 
 # ---------- Core patterns ----------
 
+# Labeled fields (both FA/EN) in one alternation → the text is scanned once.
+# Matches are zero-width (lookahead) so a value that spills onto the next line
+# can't hide that line's own label; the named group says which field matched.
+FIELDS_RX = re.compile(
+    r"(?=^\s*(?:"
+    r"(?:[#\s]*مبد[اأ]|origin|from)\s*[:：]\s*(?P<origin>[^\n]+)"
+    r"|(?:[#\s]*مقصد|destination|to)\s*[:：]\s*(?P<destination>[^\n]+)"
+    r"|(?:تاریخ(?:\s*پرواز)?|date|flight\s*date|departure\s*date)\s*[:：]?\s*(?P<date>[^\n]+)"
+    r"|(?:زمان(?:\s*پرواز)?|ساعت|time|departure\s*time|at)\s*[:：]?\s*(?P<time>[^\n]+)"
+    r"|(?:پرواز|airline)\s*[:：]\s*(?P<airline>[^\n]+)"
+    r"))",
+    re.I | re.M,
+)
+
 PAT = {
-    # Labeled fields (both FA/EN)
-    "origin": re.compile(r"(?:^|\n)\s*(?:[#\s]*(?:مبدا|مبدأ)|origin|from)\s*[:：]\s*([^\n]+)", re.I),
-    "destination": re.compile(r"(?:^|\n)\s*(?:[#\s]*مقصد|destination|to)\s*[:：]\s*([^\n]+)", re.I),
-    "date": re.compile(r"(?:^|\n)\s*(?:تاریخ(?:\s*پرواز)?|date|flight\s*date|departure\s*date)\s*[:：]?\s*([^\n]+)", re.I),
-    "time": re.compile(r"(?:^|\n)\s*(?:زمان(?:\s*پرواز)?|ساعت|time|departure\s*time|at)\s*[:：]?\s*([^\n]+)", re.I),
-    "airline": re.compile(r"(?:^|\n)\s*(?:پرواز|airline)\s*[:：]\s*([^\n]+)", re.I),
     # From → To inline (EN): "from Tehran to Toronto"
     "from_to_en": re.compile(r"\bfrom\s+(.+?)\s+to\s+(.+?)(?:[\s\.,;]|$)", re.I),
     # From → To inline (FA): "از تهران به تورنتو"
@@ -196,11 +262,25 @@ PAT = {
     "tags": HASHTAG_RX,
 }
 
-def _extract_contacts(text: str) -> Tuple[str, str, str]:
-    handles = set(HANDLE_RX.findall(text))
-    phones  = set(norm_digits(p) for p in PHONE_RX.findall(text))
-    tags    = set(HASHTAG_RX.findall(text))
-    return ";".join(sorted(handles)), ";".join(sorted(phones)), ";".join(sorted(tags))
+# handles / phones. Hashtags stay a separate scan: #\S+ would otherwise swallow
+# a contact glued to it ("#تماس:0912...", "#مسافر@ali").
+CONTACT_RX = re.compile(f"(?P<handle>{HANDLE_RX.pattern})|(?P<phone>{PHONE_RX.pattern})")
+
+# Fields + contacts fused → extract_flight_fields walks the message once.
+# Field matches are zero-width, so contacts inside a labeled line still match.
+MASTER_RX = re.compile(f"{FIELDS_RX.pattern}|{CONTACT_RX.pattern}", re.I | re.M)
+_CONTACT_KINDS = ("handle", "phone")
+
+# Every FIELDS_RX label starts with one of these (lowercased). Messages with no
+# line starting that way skip the field alternatives and only get the contact scan.
+_TRIGGERS = ("مبد", "مقصد", "تاریخ", "زمان", "ساعت", "پرواز",
+             "origin", "from", "destination", "to", "date", "flight", "departure",
+             "time", "at", "airline")
+# what FIELDS_RX may skip before a label ([#\s]*); all Unicode spaces are <= U+3000
+_LABEL_LEAD = "#" + "".join(c for c in map(chr, range(0x3001)) if c.isspace())
+
+def _has_label_line(low: str) -> bool:
+    return any(line.lstrip(_LABEL_LEAD).startswith(_TRIGGERS) for line in low.split("\n"))
 
 # ---------- Public API ----------
 
@@ -212,6 +292,12 @@ def extract_flight_fields(raw_text: str) -> Dict[str, str]:
       flight_date_text, flight_time_text, flight_date_iso, airline,
       contact_handles, contact_phones, raw_text
     """
+    return dict(_extract_cached(raw_text))
+
+# Forwards/reposts repeat the exact text → cache by it. Items are stored as an
+# immutable tuple so every caller still gets its own fresh dict.
+@lru_cache(maxsize=4096)
+def _extract_cached(raw_text: str) -> Tuple[Tuple[str, str], ...]:
     t = cleanup(raw_text)
     t_digits = norm_digits(t)
 
@@ -226,49 +312,58 @@ def extract_flight_fields(raw_text: str) -> Dict[str, str]:
         "raw_text": t.replace("\n", " "),
     }
 
-    # contacts + tags
-    handles, phones, tags = _extract_contacts(t_digits)
-    out["contact_handles"], out["contact_phones"], out["type_tags"] = handles, phones, tags
-
-    # 1) labeled fields first
-    m = PAT["origin"].search(t)
-    if m:
-        city, area = split_city_area(m.group(1)); out["origin"], out["origin_area"] = city, area
-
-    m = PAT["destination"].search(t)
-    if m:
-        city, area = split_city_area(m.group(1)); out["destination"], out["destination_area"] = city, area
-
-    m = PAT["date"].search(t)
-    if m:
-        out["flight_date_text"] = cleanup(m.group(1))
+    # 1) labeled fields (first occurrence of each wins) + contacts, one pass.
+    # Digit folding is 1:1, so field spans found in t_digits slice t unchanged.
+    found: Dict[str, str] = {}
+    contacts = {k: {} for k in _CONTACT_KINDS}   # dict keys: dedupe, first-seen order
+    low = t_digits.lower()
+    rx = MASTER_RX if _has_label_line(low) else CONTACT_RX
+    for m in rx.finditer(t_digits):
+        g = m.lastgroup
+        if g in contacts:
+            contacts[g][m.group()] = None
+        elif g not in found:
+            a, b = m.span(g)
+            found[g] = t[a:b]
+
+    out["contact_handles"] = ";".join(contacts["handle"])
+    out["contact_phones"]  = ";".join(contacts["phone"])
+    tags = HASHTAG_RX.findall(t_digits) if "#" in t_digits else ()
+    out["type_tags"]       = ";".join(dict.fromkeys(tags))
+
+    if "origin" in found:
+        city, area = split_city_area(found["origin"]); out["origin"], out["origin_area"] = city, area
+
+    if "destination" in found:
+        city, area = split_city_area(found["destination"]); out["destination"], out["destination_area"] = city, area
+
+    if "date" in found:
+        out["flight_date_text"] = cleanup(found["date"])
         out["flight_date_iso"]  = parse_date_guess(out["flight_date_text"])
 
-    m = PAT["time"].search(t)
-    if m:
-        out["flight_time_text"] = parse_time_guess(m.group(1)) or cleanup(m.group(1))
+    if "time" in found:
+        out["flight_time_text"] = parse_time_guess(found["time"]) or cleanup(found["time"])
 
-    m = PAT["airline"].search(t)
-    if m:
+    if "airline" in found:
         # If line contains known airline word, keep that; else keep the line text
-        line = cleanup(m.group(1))
-        known = re.search(AIRLINE_WORDS, line, re.I)
+        line = cleanup(found["airline"])
+        known = AIRLINE_RX.search(line)
         out["airline"] = cleanup(known.group(0)) if known else line
 
     # 2) if origin/destination still empty, try inline "from X to Y" (EN/FA)
-    if not out["origin"] or not out["destination"]:
+    if (not out["origin"] or not out["destination"]) and "from" in low:
         m = PAT["from_to_en"].search(t)
         if m:
             oc, da = split_city_area(m.group(1)); out["origin"], out["origin_area"] = oc, da
             dc, aa = split_city_area(m.group(2)); out["destination"], out["destination_area"] = dc, aa
 
-    if not out["origin"] or not out["destination"]:
+    if (not out["origin"] or not out["destination"]) and "از" in t:
         m = PAT["from_to_fa"].search(t)
         if m:
             oc, da = split_city_area(m.group(1)); out["origin"], out["origin_area"] = oc, da
             dc, aa = split_city_area(m.group(2)); out["destination"], out["destination_area"] = dc, aa
 
-    return out
+    return tuple(out.items())
 
 # ---------- Local test ----------
 if __name__ == "__main__":
@@ -290,6 +385,9 @@ if __name__ == "__main__":
         """,
         """از مشهد به کلگری، 5 سپتامبر، ساعت 7 عصر
         تماس: @ali""",
+        # contacts glued to a hashtag are still picked up
+        """#مسافر@ali
+        #تماس:09121234567""",
     ]
     for s in samples:
         print("----")
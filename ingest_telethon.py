@@ -1,6 +1,7 @@
 # ingest_telethon.py — read Telegram messages → parse → save to DB
 
 import os, asyncio, json
+from concurrent.futures import ProcessPoolExecutor
 from datetime import timezone, date
 from telethon import TelegramClient
 from telethon.sessions import StringSession
@@ -25,6 +26,8 @@ SESSION     = os.getenv("TG_SESSION", "ingest_session")
 SESSION_STR = os.getenv("TG_SESSION_STRING")
 LIMIT       = int(os.getenv("TG_LIMIT", "500"))  # how many messages per run
 SEARCH      = os.getenv("TG_SEARCH")             # optional filter (e.g., "#مسافر")
+BATCH       = int(os.getenv("TG_BATCH", "500"))  # rows per bulk INSERT
+PARSE_BATCH = 32                                 # messages handed to the parser pool at once
 
 def make_client():
     return TelegramClient(StringSession(SESSION_STR), API_ID, API_HASH) if SESSION_STR \
@@ -32,10 +35,18 @@ def make_client():
 
 STATE_FILE = "state.json"  # remembers last_id per chat so you only fetch new messages
 
-from extractor import extract_flight_fields
+from extractor import extract_flight_fields, contains_persian, contact_rows
 from city_map import to_code
-from db import SessionLocal
-from models import AppUser, Post, Trip
+from sqlalchemy import select
+
+from db import SessionLocal, engine
+from models import AppUser, Post, app_user_table, post_table, trip_table, post_contact_table
+
+# INSERT ... ON CONFLICT DO NOTHING exists in both dialects we run on
+if engine.dialect.name == "postgresql":
+    from sqlalchemy.dialects.postgresql import insert
+else:
+    from sqlalchemy.dialects.sqlite import insert
 
 def _load_state():
     try:
@@ -46,6 +57,93 @@ def _load_state():
 def _save_state(s):
     json.dump(s, open(STATE_FILE, "w", encoding="utf-8"))
 
+EXECUTOR = ProcessPoolExecutor(max_workers=os.cpu_count())  # regex parsing off the event loop
+
+def _rows(chat_id, m, tg_id, fields):
+    """Post + Trip column dicts for one parsed message."""
+    post = dict(
+        _tg_id=tg_id,
+        chat_id=chat_id,
+        message_id=m.id,
+        posted_at=m.date.astimezone(timezone.utc) if m.date else None,
+        raw_text=fields["raw_text"],
+        lang="fa" if contains_persian(fields["raw_text"]) else "en",
+        type_tag=("مسافر" if "مسافر" in fields["type_tags"]
+                 else ("قبول_بار" if "قبول" in fields["type_tags"] else None)),
+        contact_handles=fields["contact_handles"].split(";") if fields["contact_handles"] else [],
+        contact_phones=fields["contact_phones"].split(";") if fields["contact_phones"] else [],
+    )
+
+    # normalize date
+    iso = (fields.get("flight_date_iso") or "").strip()
+    iso_date = None
+    if len(iso) == 10:
+        try:
+            y, mn, dd = map(int, iso.split("-"))
+            iso_date = date(y, mn, dd)
+        except Exception:
+            pass
+
+    trip = dict(
+        origin_city=fields["origin"],
+        origin_area=fields["origin_area"],
+        origin_code=to_code(fields["origin"]) or to_code(fields["origin_area"]),
+        destination_city=fields["destination"],
+        destination_area=fields["destination_area"],
+        destination_code=to_code(fields["destination"]) or to_code(fields["destination_area"]),
+        airline=fields["airline"],
+        flight_date_text=fields["flight_date_text"],
+        flight_time_text=fields["flight_time_text"],
+        flight_date=iso_date,
+    )
+    return post, trip
+
+async def _parse_batch(chat_id, batch):
+    """Run extract_flight_fields for (message, tg_id, text) items in the process pool."""
+    loop = asyncio.get_running_loop()
+    parsed = await asyncio.gather(*[loop.run_in_executor(EXECUTOR, extract_flight_fields, text)
+                                    for _, _, text in batch])
+    return [_rows(chat_id, m, tg_id, fields) for (m, tg_id, _), fields in zip(batch, parsed)]
+
+def _flush(db, users, posts, trips, user_ids):
+    """Bulk-insert one chunk: users first (for ids), then posts, then trips + contacts.
+
+    Plain Core INSERTs on the tables — no ORM unit-of-work per row. Users and
+    posts another worker already stored are skipped by their unique keys
+    (telegram_id / chat_id+message_id); skipped posts take their trip/contact
+    rows with them. Returns the number of posts actually inserted.
+    """
+    if users:
+        stmt = (insert(app_user_table).values(users)
+                .on_conflict_do_nothing(index_elements=["telegram_id"])
+                .returning(app_user_table.c.id, app_user_table.c.telegram_id))
+        for uid, tg_id in db.execute(stmt):
+            user_ids[tg_id] = uid
+        # users another run inserted first: RETURNING skips them → look their ids up
+        missing = [u["telegram_id"] for u in users if u["telegram_id"] not in user_ids]
+        if missing:
+            stmt = (select(app_user_table.c.telegram_id, app_user_table.c.id)
+                    .where(app_user_table.c.telegram_id.in_(missing)))
+            user_ids.update(db.execute(stmt).all())
+    for p in posts:
+        p["posted_by"] = user_ids.get(p.pop("_tg_id"))
+    stmt = (insert(post_table).values(posts)
+            .on_conflict_do_nothing(index_elements=["chat_id", "message_id"])
+            .returning(post_table.c.id, post_table.c.message_id))
+    ids = {mid: pid for pid, mid in db.execute(stmt)}
+    kept = [(p, t) for p, t in zip(posts, trips) if p["message_id"] in ids]
+    posts = []
+    for p, t in kept:
+        p["id"] = t["post_id"] = ids[p["message_id"]]
+        posts.append(p)
+    if kept:
+        db.execute(insert(trip_table), [t for _, t in kept])
+    contacts = [row for p in posts
+                for row in contact_rows(p["id"], p["contact_handles"], p["contact_phones"])]
+    if contacts:
+        db.execute(insert(post_contact_table), contacts)
+    return len(ids)
+
 async def main():
     client = make_client()
     await client.start()
@@ -59,6 +157,15 @@ async def main():
     max_id = last_id
 
     try:
+        # preload what we already have → no per-message SELECTs
+        existing = {mid for (mid,) in db.query(Post.message_id)
+                    .filter(Post.chat_id == entity.id, Post.message_id >= last_id).all()}
+        user_ids = dict(db.query(AppUser.telegram_id, AppUser.id).all())
+
+        new_users, new_posts, new_trips = {}, [], []
+        batch = []   # (message, tg_id, text) waiting for the parser pool
+        senders = {}   # m.sender_id → resolved tg id; one get_sender RPC per distinct sender
+
         # ==== THIS IS WHERE THE SCAN HAPPENS ====
         it = client.iter_messages(
             entity,
@@ -72,75 +179,49 @@ async def main():
             if not text:
                 continue
 
-            # upsert sender (AppUser)
-            try:
-                s = await m.get_sender()
-                tg_id = getattr(s, "id", None)
-                u = db.query(AppUser).filter_by(telegram_id=tg_id).one_or_none()
-                if not u:
-                    display = " ".join(filter(None, [getattr(s, "first_name", None),
-                                                     getattr(s, "last_name", None)])) or None
-                    u = AppUser(telegram_id=tg_id,
-                                username=getattr(s, "username", None),
-                                display_name=display)
-                    db.add(u); db.flush()
-            except Exception:
-                u = None
-
             # skip duplicates
-            if db.query(Post).filter_by(chat_id=entity.id, message_id=m.id).first():
+            if m.id in existing:
                 if m.id > max_id: max_id = m.id
                 continue
+            existing.add(m.id)
 
-            # parse with bilingual extractor
-            fields = extract_flight_fields(text)
-
-            post = Post(
-                chat_id=entity.id,
-                message_id=m.id,
-                posted_at=m.date.astimezone(timezone.utc) if m.date else None,
-                posted_by=(u.id if u else None),
-                raw_text=fields["raw_text"],
-                lang="fa" if any('\u0600' <= ch <= '\u06FF' for ch in fields["raw_text"]) else "en",
-                type_tag=("مسافر" if "مسافر" in fields["type_tags"]
-                         else ("قبول_بار" if "قبول" in fields["type_tags"] else None)),
-                contact_handles=fields["contact_handles"].split(";") if fields["contact_handles"] else [],
-                contact_phones=fields["contact_phones"].split(";") if fields["contact_phones"] else [],
-            )
-            db.add(post); db.flush()
-
-            # normalize date
-            iso = (fields.get("flight_date_iso") or "").strip()
-            iso_date = None
-            if len(iso) == 10:
+            # queue sender (AppUser) if we haven't seen it yet
+            sid = m.sender_id
+            tg_id = senders.get(sid)
+            if sid is not None and sid not in senders:
                 try:
-                    y, mn, dd = map(int, iso.split("-"))
-                    iso_date = date(y, mn, dd)
+                    s = await m.get_sender()
+                    tg_id = senders[sid] = getattr(s, "id", None)
+                    if tg_id is not None and tg_id not in user_ids and tg_id not in new_users:
+                        display = " ".join(filter(None, [getattr(s, "first_name", None),
+                                                         getattr(s, "last_name", None)])) or None
+                        new_users[tg_id] = dict(telegram_id=tg_id,
+                                                username=getattr(s, "username", None),
+                                                display_name=display)
                 except Exception:
-                    pass
-
-            trip = Trip(
-                post_id=post.id,
-                origin_city=fields["origin"],
-                origin_area=fields["origin_area"],
-                origin_code=to_code(fields["origin"]) or to_code(fields["origin_area"]),
-                destination_city=fields["destination"],
-                destination_area=fields["destination_area"],
-                destination_code=to_code(fields["destination"]) or to_code(fields["destination_area"]),
-                airline=fields["airline"],
-                flight_date_text=fields["flight_date_text"],
-                flight_time_text=fields["flight_time_text"],
-                flight_date=iso_date,
-            )
-            db.add(trip)
-
-            added += 1
+                    tg_id = None
+
+            # parse with bilingual extractor (in PARSE_BATCH chunks)
+            batch.append((m, tg_id, text))
             if m.id > max_id: max_id = m.id
-            if added % 50 == 0:
-                db.commit()
-                print(f"Committed {added} posts... last_id={max_id}")
+            if len(batch) < PARSE_BATCH:
+                continue
+            for post, trip in await _parse_batch(entity.id, batch):
+                new_posts.append(post); new_trips.append(trip)
+            batch = []
+
+            if len(new_posts) >= BATCH:
+                added += _flush(db, list(new_users.values()), new_posts, new_trips, user_ids)
+                new_users, new_posts, new_trips = {}, [], []
+                print(f"Flushed {added} posts... last_id={max_id}")
+
+        for post, trip in await _parse_batch(entity.id, batch):
+            new_posts.append(post); new_trips.append(trip)
+
+        if new_posts:
+            added += _flush(db, list(new_users.values()), new_posts, new_trips, user_ids)
 
-        db.commit()
+        db.commit()   # one transaction for the whole run
         state[str(entity.id)] = max_id
         _save_state(state)
         print(f"✅ Done. Added {added} new posts. last_id={max_id}")
@@ -1,6 +1,7 @@
 # main.py — sanity check: read recent messages, parse, write flights.csv
 
 import os, asyncio, csv
+from concurrent.futures import ProcessPoolExecutor
 from datetime import timezone
 from telethon import TelegramClient
 from telethon.sessions import StringSession
@@ -21,44 +22,96 @@ SESSION_STR = os.getenv("TG_SESSION_STRING")  # if set, no interactive login nee
 
 OUT_CSV = "flights.csv"
 LIMIT   = 200  # how many recent messages to scan
+PARSE_BATCH = 256  # messages handed to one worker at a time
+WORKERS = os.cpu_count() or 1
 
-async def run():
-    client = TelegramClient(StringSession(SESSION_STR), API_ID, API_HASH) if SESSION_STR \
-             else TelegramClient(SESSION, API_ID, API_HASH)
-    await client.start()  # first time (file session) will ask for phone + code
-    entity = await client.get_entity(TARGET)
+COLS = (
+    "message_id","date_utc","type_tags",
+    "origin","origin_area","destination","destination_area",
+    "flight_date_text","flight_time_text","flight_date_iso",
+    "airline","contact_handles","contact_phones","raw_text"
+)
+FIELD_COLS = COLS[2:]  # taken straight from extract_flight_fields
+
+EXECUTOR = ProcessPoolExecutor(max_workers=WORKERS)  # regex parsing off the event loop
 
+def _parse_batch(batch):
+    """CSV rows for the flight-like posts among (message_id, date_utc, text) items; runs in a worker."""
     rows = []
+    for msg_id, date_utc, text in batch:
+        # parse with bilingual extractor
+        fields = extract_flight_fields(text)
+
+        # keep only "flight-like" posts (tune as you like)
+        if fields["origin"] or fields["destination"] or fields["flight_date_text"]:
+            rows.append((msg_id, date_utc, *(fields[c] for c in FIELD_COLS)))
+    return rows
+
+async def _produce(client, entity, q_in):
+    """Telegram fetch → (seq, PARSE_BATCH chunk) on q_in; one None per parser at the end."""
+    seq, batch = 0, []
     async for m in client.iter_messages(entity, limit=LIMIT):
         text = (m.message or "").strip()
         if not text:
             continue
+        batch.append((m.id, m.date.astimezone(timezone.utc).isoformat() if m.date else "", text))
+        if len(batch) == PARSE_BATCH:
+            await q_in.put((seq, batch))
+            seq, batch = seq + 1, []
+    if batch:
+        await q_in.put((seq, batch))
+    for _ in range(WORKERS):
+        await q_in.put(None)
 
-        # parse with bilingual extractor
-        fields = extract_flight_fields(text)
+async def _parse(q_in, q_out):
+    """Hand batches to the process pool while the producer keeps fetching."""
+    loop = asyncio.get_running_loop()
+    while (item := await q_in.get()) is not None:
+        seq, batch = item
+        await q_out.put((seq, await loop.run_in_executor(EXECUTOR, _parse_batch, batch)))
+    await q_out.put(None)
 
-        # keep only "flight-like" posts (tune as you like)
-        if fields["origin"] or fields["destination"] or fields["flight_date_text"]:
-            rows.append({
-                "message_id": m.id,
-                "date_utc": m.date.astimezone(timezone.utc).isoformat() if m.date else "",
-                **fields
-            })
-
-    # write CSV
-    if rows:
-        write_header = not os.path.exists(OUT_CSV)
-        with open(OUT_CSV, "a", newline="", encoding="utf-8-sig") as f:
-            cols = [
-                "message_id","date_utc","type_tags",
-                "origin","origin_area","destination","destination_area",
-                "flight_date_text","flight_time_text","flight_date_iso",
-                "airline","contact_handles","contact_phones","raw_text"
-            ]
-            w = csv.DictWriter(f, fieldnames=cols)
-            if write_header: w.writeheader()
+async def _write(q_out, f, w):
+    """Drain parsed rows to the CSV in message order; returns the row count."""
+    ready, next_seq, n, done = {}, 0, 0, 0
+    while done < WORKERS:
+        item = await q_out.get()
+        if item is None:
+            done += 1
+            continue
+        ready[item[0]] = item[1]
+        while next_seq in ready:
+            rows = ready.pop(next_seq)
             w.writerows(rows)
-        print(f"✅ Parsed {len(rows)} flight-like posts → {OUT_CSV}")
+            n += len(rows)
+            next_seq += 1
+        f.flush()
+    return n
+
+async def run():
+    client = TelegramClient(StringSession(SESSION_STR), API_ID, API_HASH) if SESSION_STR \
+             else TelegramClient(SESSION, API_ID, API_HASH)
+    await client.start()  # first time (file session) will ask for phone + code
+    entity = await client.get_entity(TARGET)
+
+    # stream rows to disk as they're parsed → O(1) memory, partial output survives Ctrl-C
+    write_header = not os.path.exists(OUT_CSV)
+    f = open(OUT_CSV, "a", newline="", encoding="utf-8-sig")
+    try:
+        w = csv.writer(f)
+        if write_header: w.writerow(COLS)
+        # fetch → parse → write overlap; bounded queues keep memory flat
+        q_in, q_out = asyncio.Queue(maxsize=2 * WORKERS), asyncio.Queue(maxsize=2 * WORKERS)
+        *_, n = await asyncio.gather(
+            _produce(client, entity, q_in),
+            *(_parse(q_in, q_out) for _ in range(WORKERS)),
+            _write(q_out, f, w),
+        )
+    finally:
+        f.close()
+
+    if n:
+        print(f"✅ Parsed {n} flight-like posts → {OUT_CSV}")
     else:
         print("No flight-like posts found in recent messages.")
 
@@ -0,0 +1,7 @@
+-- 001: trigram GIN indexes for /search ILIKE '%...%' filters (Postgres only)
+-- New databases get these from create_tables.py; run this once on existing ones.
+
+CREATE EXTENSION IF NOT EXISTS pg_trgm;
+
+CREATE INDEX IF NOT EXISTS post_raw_text_trgm ON post USING gin (raw_text gin_trgm_ops);
+CREATE INDEX IF NOT EXISTS trip_airline_trgm  ON trip USING gin (airline gin_trgm_ops);
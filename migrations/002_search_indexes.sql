@@ -0,0 +1,5 @@
+-- 002: composite B-tree indexes matching the /search filters + ORDER BY
+-- New databases get these from create_tables.py; run this once on existing ones.
+
+CREATE INDEX IF NOT EXISTS ix_trip_route_date  ON trip (origin_code, destination_code, flight_date);
+CREATE INDEX IF NOT EXISTS ix_post_type_posted ON post (type_tag, posted_at DESC);
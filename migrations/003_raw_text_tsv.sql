@@ -0,0 +1,7 @@
+-- 003: full-text search column + GIN index for /search?q=word (Postgres only)
+-- New databases get these from create_tables.py; run this once on existing ones.
+
+ALTER TABLE post ADD COLUMN IF NOT EXISTS raw_text_tsv tsvector
+    GENERATED ALWAYS AS (to_tsvector('simple', coalesce(raw_text, ''))) STORED;
+
+CREATE INDEX IF NOT EXISTS post_raw_text_tsv ON post USING gin (raw_text_tsv);
@@ -0,0 +1,16 @@
+-- 004: fill post_contact from the JSON contact columns of existing posts (Postgres)
+-- SQLite: use 004_post_contact_backfill_sqlite.sql instead.
+-- Run python create_tables.py first: it creates the post_contact table + indexes.
+
+INSERT INTO post_contact (post_id, kind, value)
+SELECT p.id, 'handle', h.value
+FROM post p, json_array_elements_text(p.contact_handles) AS h(value)
+WHERE json_typeof(p.contact_handles) = 'array'
+  AND NOT EXISTS (SELECT 1 FROM post_contact pc WHERE pc.post_id = p.id AND pc.kind = 'handle');
+
+INSERT INTO post_contact (post_id, kind, value)
+SELECT p.id, 'phone', regexp_replace(ph.value, '[^0-9]', '', 'g')   -- phones: digits only
+FROM post p, json_array_elements_text(p.contact_phones) AS ph(value)
+WHERE json_typeof(p.contact_phones) = 'array'
+  AND regexp_replace(ph.value, '[^0-9]', '', 'g') <> ''
+  AND NOT EXISTS (SELECT 1 FROM post_contact pc WHERE pc.post_id = p.id AND pc.kind = 'phone');
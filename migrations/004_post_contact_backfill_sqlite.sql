@@ -0,0 +1,17 @@
+-- 004 (SQLite): fill post_contact from the JSON contact columns of existing posts
+-- Run python create_tables.py first: it creates the post_contact table + indexes.
+--   sqlite3 travmatch.db < migrations/004_post_contact_backfill_sqlite.sql
+
+INSERT INTO post_contact (post_id, kind, value)
+SELECT DISTINCT p.id, 'handle', h.value
+FROM post p, json_each(p.contact_handles) AS h
+WHERE json_valid(p.contact_handles)
+  AND NOT EXISTS (SELECT 1 FROM post_contact pc WHERE pc.post_id = p.id AND pc.kind = 'handle');
+
+-- phones: digits only (strips the characters the phone pattern allows)
+INSERT INTO post_contact (post_id, kind, value)
+SELECT DISTINCT p.id, 'phone', replace(replace(replace(replace(replace(replace(replace(replace(replace(ph.value, ' ', ''), '-', ''), '(', ''), ')', ''), '+', ''), char(9), ''), char(10), ''), char(13), ''), char(160), '')
+FROM post p, json_each(p.contact_phones) AS ph
+WHERE json_valid(p.contact_phones)
+  AND replace(replace(replace(replace(replace(replace(replace(replace(replace(ph.value, ' ', ''), '-', ''), '(', ''), ')', ''), '+', ''), char(9), ''), char(10), ''), char(13), ''), char(160), '') <> ''
+  AND NOT EXISTS (SELECT 1 FROM post_contact pc WHERE pc.post_id = p.id AND pc.kind = 'phone');
@@ -0,0 +1,4 @@
+-- 005: one post per (chat_id, message_id) — lets ingest use INSERT ... ON CONFLICT DO NOTHING
+-- Works on Postgres and SQLite. Remove existing duplicates first if this fails.
+
+CREATE UNIQUE INDEX IF NOT EXISTS uq_post_chat_msg ON post (chat_id, message_id);
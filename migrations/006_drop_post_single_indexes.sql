@@ -0,0 +1,7 @@
+-- 006: post lookups go through the (chat_id, message_id) unique index from 005;
+-- the old single-column indexes only cost write time. Works on Postgres and SQLite.
+-- Run 005 first if you haven't.
+
+CREATE UNIQUE INDEX IF NOT EXISTS uq_post_chat_msg ON post (chat_id, message_id);
+DROP INDEX IF EXISTS ix_post_chat_id;
+DROP INDEX IF EXISTS ix_post_message_id;
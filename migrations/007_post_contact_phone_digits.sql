@@ -0,0 +1,7 @@
+-- 007: phones in post_contact are matched digits-only; rewrite rows stored with formatting (Postgres)
+-- SQLite: use 007_post_contact_phone_digits_sqlite.sql instead.
+
+UPDATE post_contact SET value = regexp_replace(value, '[^0-9]', '', 'g')
+WHERE kind = 'phone' AND value ~ '[^0-9]';
+
+DELETE FROM post_contact WHERE kind = 'phone' AND value = '';
@@ -0,0 +1,7 @@
+-- 007 (SQLite): phones in post_contact are matched digits-only; rewrite rows stored with formatting
+--   sqlite3 travmatch.db < migrations/007_post_contact_phone_digits_sqlite.sql
+
+UPDATE post_contact SET value = replace(replace(replace(replace(replace(replace(replace(replace(replace(value, ' ', ''), '-', ''), '(', ''), ')', ''), '+', ''), char(9), ''), char(10), ''), char(13), ''), char(160), '')
+WHERE kind = 'phone' AND value GLOB '*[^0-9]*';
+
+DELETE FROM post_contact WHERE kind = 'phone' AND value = '';
@@ -1,13 +1,19 @@
 # models.py (SQLite-friendly)
 from sqlalchemy.orm import declarative_base, relationship
 from sqlalchemy import (
-    Column, Integer, Text, Boolean, Date, TIMESTAMP, ForeignKey
+    Column, Integer, Text, Boolean, Date, TIMESTAMP, ForeignKey, Index, DDL, event
 )
 from sqlalchemy.sql import func
 from sqlalchemy.types import JSON  # JSON works on SQLite (stored as TEXT)
 
 Base = declarative_base()
 
+# Postgres: trigram ops for the GIN indexes below (ILIKE '%q%' can use them)
+event.listen(
+    Base.metadata, "before_create",
+    DDL("CREATE EXTENSION IF NOT EXISTS pg_trgm").execute_if(dialect="postgresql"),
+)
+
 class AppUser(Base):
     __tablename__ = "app_user"
     __table_args__ = {"sqlite_autoincrement": True}
@@ -20,15 +26,21 @@ class AppUser(Base):
     is_verified = Column(Boolean, default=False)
     created_at = Column(TIMESTAMP(timezone=True), server_default=func.now())
 
-    posts = relationship("Post", backref="user", lazy="selectin")
+    posts = relationship("Post", backref="user", lazy="raise")   # load explicitly with selectinload()
 
 class Post(Base):
     __tablename__ = "post"
-    __table_args__ = {"sqlite_autoincrement": True}
+    __table_args__ = (
+        # dedupe key for ingest (ON CONFLICT); also serves chat_id-only lookups
+        Index("uq_post_chat_msg", "chat_id", "message_id", unique=True),
+        Index("post_raw_text_trgm", "raw_text", postgresql_using="gin",
+              postgresql_ops={"raw_text": "gin_trgm_ops"}).ddl_if(dialect="postgresql"),
+        {"sqlite_autoincrement": True},
+    )
 
     id = Column(Integer, primary_key=True, autoincrement=True)   # <-- Integer
-    chat_id = Column(Integer, index=True, nullable=True)
-    message_id = Column(Integer, index=True, nullable=True)
+    chat_id = Column(Integer, nullable=True)
+    message_id = Column(Integer, nullable=True)
     posted_at = Column(TIMESTAMP(timezone=True))
     posted_by = Column(Integer, ForeignKey("app_user.id"))       # <-- Integer FK
     raw_text = Column(Text, nullable=False)
@@ -37,11 +49,15 @@ class Post(Base):
     contact_handles = Column(JSON)
     contact_phones  = Column(JSON)
 
-    trip = relationship("Trip", uselist=False, backref="post", lazy="joined")
+    trip = relationship("Trip", uselist=False, backref="post", lazy="select")  # joinedload() where needed
 
 class Trip(Base):
     __tablename__ = "trip"
-    __table_args__ = {"sqlite_autoincrement": True}
+    __table_args__ = (
+        Index("trip_airline_trgm", "airline", postgresql_using="gin",
+              postgresql_ops={"airline": "gin_trgm_ops"}).ddl_if(dialect="postgresql"),
+        {"sqlite_autoincrement": True},
+    )
 
     id = Column(Integer, primary_key=True, autoincrement=True)   # <-- Integer
     post_id = Column(Integer, ForeignKey("post.id", ondelete="CASCADE"), unique=True, index=True)
@@ -55,3 +71,39 @@ class Trip(Base):
     flight_date_text = Column(Text)
     flight_time_text = Column(Text)
     flight_date = Column(Date)
+
+class PostContact(Base):
+    """One row per handle/phone of a post, so contact lookups can use an index."""
+    __tablename__ = "post_contact"
+    __table_args__ = (
+        Index("ix_post_contact_value_kind", "value", "kind"),
+        Index("post_contact_value_trgm", "value", postgresql_using="gin",
+              postgresql_ops={"value": "gin_trgm_ops"}).ddl_if(dialect="postgresql"),
+        {"sqlite_autoincrement": True},
+    )
+
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    post_id = Column(Integer, ForeignKey("post.id", ondelete="CASCADE"), index=True)
+    kind = Column(Text, nullable=False)    # 'handle' | 'phone'
+    value = Column(Text, nullable=False)   # phones: digits only, see extractor.contact_rows()
+
+# Postgres full-text: generated tsvector over raw_text ('simple' = no stemming, safe for Farsi)
+event.listen(
+    Post.__table__, "after_create",
+    DDL("ALTER TABLE post ADD COLUMN raw_text_tsv tsvector GENERATED ALWAYS AS "
+        "(to_tsvector('simple', coalesce(raw_text, ''))) STORED").execute_if(dialect="postgresql"),
+)
+event.listen(
+    Post.__table__, "after_create",
+    DDL("CREATE INDEX post_raw_text_tsv ON post USING gin (raw_text_tsv)").execute_if(dialect="postgresql"),
+)
+
+# Composite indexes matching /search: route + date range, and type + newest first
+Index("ix_trip_route_date", Trip.origin_code, Trip.destination_code, Trip.flight_date)
+Index("ix_post_type_posted", Post.type_tag, Post.posted_at.desc())
+
+# Core tables for bulk writes (ingest); the ORM classes above are for reads
+app_user_table = AppUser.__table__
+post_table = Post.__table__
+trip_table = Trip.__table__
+post_contact_table = PostContact.__table__